@@ -6,8 +6,6 @@
 # See https://aboutcode.org for more information about nexB OSS projects.
 #
 
-import re
-
 MANIFEST_JSON_FILE = 'manifest.json'
 
 LAYER_TAR_FILE = 'layer.tar'
@@ -15,9 +13,23 @@ LAYER_TAR_FILE = 'layer.tar'
 EMPTY_SHA256 = 'e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855'
 EMPTY_DIGEST = 'sha256:' + EMPTY_SHA256
 
+HEX_DIGITS = frozenset('0123456789abcdefABCDEF')
+
 
 def is_image_or_layer_id(s):
     """
     Return True if the string `s` looks like a layer ID e.g. a SHA256-like id.
+
+    For example::
+    >>> is_image_or_layer_id(EMPTY_SHA256)
+    True
+    >>> is_image_or_layer_id(EMPTY_SHA256.upper())
+    True
+    >>> is_image_or_layer_id(EMPTY_DIGEST)
+    False
+    >>> is_image_or_layer_id(EMPTY_SHA256[:-1] + 'g')
+    False
+    >>> is_image_or_layer_id('')
+    False
     """
-    return re(r'^[a-f0-9]{64}$', re.IGNORECASE).match(s)
+    return bool(s) and len(s) == 64 and HEX_DIGITS.issuperset(s)
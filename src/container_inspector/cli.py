@@ -72,12 +72,14 @@ def _container_inspector_dockerfile(directory, json=False, csv=False):
             [df for _loc, df in dockerfiles.items()], indent=2))
 
     if csv:
-        dockerfiles = list(dockerfile.flatten_dockerfiles(dockerfiles))
-        keys = dockerfiles[0].keys()
-        w = csv_module.DictWriter(sys.stdout, keys)
+        flat = dockerfile.flatten_dockerfiles(dockerfiles)
+        first = next(flat, None)
+        if not first:
+            return
+        w = csv_module.DictWriter(sys.stdout, first.keys())
         w.writeheader()
-        for df in dockerfiles:
-            w.writerow(df)
+        w.writerow(first)
+        w.writerows(flat)
 
 
 @click.command()
@@ -107,17 +109,17 @@ def _container_inspector(image_path, extract_to=None, csv=False, _layer_path_seg
     else:
         from io import StringIO
         output = StringIO()
-        flat = list(image.flatten_images_data(
+        flat = image.flatten_images_data(
             images=images,
             layer_path_segments=_layer_path_segments
-        ))
-        if not flat:
+        )
+        first = next(flat, None)
+        if not first:
             return
-        keys = flat[0].keys()
-        w = csv_module.DictWriter(output, keys)
+        w = csv_module.DictWriter(output, first.keys())
         w.writeheader()
-        for f in flat:
-            w.writerow(f)
+        w.writerow(first)
+        w.writerows(flat)
         val = output.getvalue()
         output.close()
         return val
@@ -8,12 +8,14 @@
 
 import logging
 import os
+import shlex
+from copy import copy
 from os import path
 
 import attr
-from commoncode.distro import parse_os_release
 
 from container_inspector import rootfs
+from container_inspector import utils
 
 
 TRACE = False
@@ -35,8 +37,72 @@ See https://www.freedesktop.org/software/systemd/man/os-release.html
 
 os_choices = 'linux', 'bsd', 'windows',
 
-
-@attr.attributes
+# mapping of distro categories: see Distro.categories()
+DISTRO_CATEGORIES = dict(
+    rpm=dict(
+        redhat=('fedora', 'centos', 'rhel', 'amazon',
+                'scientific', 'oraclelinux',),
+        suse=('opensuse', 'suse', 'sles', 'sled', 'sles_sap',
+              'opensuse-leap', 'opensuse-tumbleweed',),
+        altlinux=('altlinux',),
+        photon=('photon',),
+        mandriva=('mandriva', 'mageia', 'mandrake', 'open-mandriva'),
+    ),
+    debian=('debian', 'kali', 'linuxmint', 'raspbian', 'ubuntu',),
+    arch=('archlinux', 'antergos', 'manjaro',),
+    slackware=('slackware',),
+    gentoo=('gentoo',),
+    alpine=('alpine',),
+    openwrt=('openwrt', 'lede',),
+    bsd=dict(
+        freebsd=('freebsd',),
+        openbsd=('openbsd',),
+        netbsd=('netbsd',),
+        dragonfly=('dragonfly',),
+    ),
+)
+
+# mapping of os-release keys to the corresponding Distro field name
+OS_RELEASE_FIELDS = {
+    'OS': 'os',
+    'NAME': 'name',
+    'ID': 'identifier',
+    'ARCHITECTURE': 'architecture',
+    'VERSION': 'version',
+    'ID_LIKE': 'id_like',
+    'VERSION_CODENAME': 'version_codename',
+    'VERSION_ID': 'version_id',
+    'PRETTY_NAME': 'pretty_name',
+    'CPE_NAME': 'cpe_name',
+    'HOME_URL': 'home_url',
+    'DOCUMENTATION_URL': 'documentation_url',
+    'SUPPORT_URL': 'support_url',
+    'BUG_REPORT_URL': 'bug_report_url',
+    'PRIVACY_POLICY_URL': 'privacy_policy_url',
+    'BUILD_ID': 'build_id',
+    'VARIANT': 'variant',
+    'VARIANT_ID': 'variant_id',
+    'LOGO': 'logo',
+}
+
+# os-release keys that are neither Distro fields nor kept as extra data
+IGNORED_OS_RELEASE_KEYS = frozenset([
+    'ANSI_COLOR',
+])
+
+# sequence of (os, Distro finder classmethod name) tried in this order to find
+# the distro of a rootfs
+DISTRO_FINDERS = (
+    ('linux', 'find_linux_details'),
+    ('windows', 'find_windows_details'),
+    ('freebsd', 'find_freebsd_details'),
+)
+
+# identifiers of Debian and Debian-derived distros
+DEBIAN_IDS = frozenset(DISTRO_CATEGORIES['debian'])
+
+
+@attr.attributes(slots=True)
 class Distro(object):
     """
     Configuration data. Shared definition as found in a layer json file and an
@@ -278,11 +344,29 @@ class Distro(object):
     )
 
     def is_debian_based(self):
-        return (
-            self.identifier == 'debian'
-            or self.identifier == 'ubuntu'
-            or (self.id_like and 'debian' in (self.id_like or ''))
-        )
+        """
+        Return True if this distro is Debian or derived from Debian.
+
+        For example::
+        >>> Distro(identifier='ubuntu').is_debian_based()
+        True
+        >>> Distro(identifier='foo', id_like=['ubuntu', 'debian']).is_debian_based()
+        True
+        >>> Distro(identifier='foo', id_like='ubuntu debian').is_debian_based()
+        True
+        >>> Distro(identifier='foo', id_like='debianoid').is_debian_based()
+        False
+        >>> Distro(identifier='fedora').is_debian_based()
+        False
+        """
+        if self.identifier in DEBIAN_IDS:
+            return True
+        id_like = self.id_like
+        if not id_like:
+            return False
+        if isinstance(id_like, str):
+            id_like = id_like.split()
+        return 'debian' in id_like
 
     def to_dict(self):
         return attr.asdict(self)
@@ -295,45 +379,33 @@ class Distro(object):
         Raise an Exception if the os-release file is invalid and cannot be
         parsed
         """
-        if not location or not os.path.exists(location):
+        data = get_os_release_data(location)
+        if data is None:
             if TRACE:
                 logger.debug(
                     f'from_os_release_file: {location!r} does not exists')
             return
 
-        data = parse_os_release(location) or {}
-        new_data = dict(
-            # This idiom looks a tad wierd but we want to always get a linux as
-            # default even if the poped value is an empty string or None
-            os=data.pop('OS', 'linux') or 'linux',
-            name=data.pop('NAME', 'linux') or 'linux',
-            identifier=data.pop('ID', 'linux') or 'linux',
-
-            architecture=data.pop('ARCHITECTURE', None),
-            version=data.pop('VERSION', None),
-            id_like=data.pop('ID_LIKE', None),
-            version_codename=data.pop('VERSION_CODENAME', None),
-            version_id=data.pop('VERSION_ID', None),
-            pretty_name=data.pop('PRETTY_NAME', None),
-            cpe_name=data.pop('CPE_NAME', None),
-            home_url=data.pop('HOME_URL', None),
-            documentation_url=data.pop('DOCUMENTATION_URL', None),
-            support_url=data.pop('SUPPORT_URL', None),
-            bug_report_url=data.pop('BUG_REPORT_URL', None),
-            privacy_policy_url=data.pop('PRIVACY_POLICY_URL', None),
-            build_id=data.pop('BUILD_ID', None),
-            variant=data.pop('VARIANT', None),
-            variant_id=data.pop('VARIANT_ID', None),
-            logo=data.pop('LOGO', None),
-        )
+        new_data = {}
+        extra_data = {}
+        for key, value in data.items():
+            field_name = OS_RELEASE_FIELDS.get(key)
+            if field_name:
+                new_data[field_name] = value
+            elif key not in IGNORED_OS_RELEASE_KEYS:
+                # the remainder are unknown, extra data
+                extra_data[key] = value
 
-        # ignored this
-        data.pop('ANSI_COLOR', None)
+        # we want to always get a linux as default even if the value is an
+        # empty string or None
+        for field_name in ('os', 'name', 'identifier',):
+            new_data[field_name] = new_data.get(field_name) or 'linux'
 
-        # note: we poped all known key/value pairs above.
-        # therefore the remainder are unknown, extra data.
-        if data:
-            new_data['extra_data'] = data
+        # ID_LIKE is a space-separated list of ids
+        new_data['id_like'] = (new_data.get('id_like') or '').split()
+
+        if extra_data:
+            new_data['extra_data'] = extra_data
 
         if TRACE:
             logger.debug(f'from_os_release_file: new_data: {new_data!r}')
@@ -368,17 +440,11 @@ class Distro(object):
                 logger.debug(f'from_rootfs: {location!r} does not exists')
             return
 
-        finders = {
-            'linux': cls.find_linux_details,
-            'windows': cls.find_windows_details,
-            'freebsd': cls.find_freebsd_details,
-        }
-
-        for finder_os, finder in finders.items():
+        for finder_os, finder_name in DISTRO_FINDERS:
             if TRACE:
                 logger.debug(f'from_rootfs: trying finder_os: {finder_os!r}')
 
-            found = finder(location)
+            found = getattr(cls, finder_name)(location)
             if TRACE:
                 logger.debug(f'from_rootfs: trying found: {found!r}')
             if found:
@@ -412,8 +478,10 @@ class Distro(object):
         # note: /etc/os-release has precedence over /usr/lib/os-release.
         for candidate_path in ('etc/os-release', 'usr/lib/os-release',):
             os_release = path.join(location, candidate_path)
-            if path.exists(os_release):
-                return cls.from_os_release_file(location=os_release)
+            # this is None if there is no os-release file
+            distro = cls.from_os_release_file(location=os_release)
+            if distro:
+                return distro
 
     @classmethod
     def find_windows_details(cls, location):
@@ -430,8 +498,10 @@ class Distro(object):
     @classmethod
     def find_freebsd_details(cls, location):
         """
-        Find a FreeBSDinstallation details and return a Distro object or None.
+        Find a FreeBSD installation details and return a Distro object or None.
+        Not yet implemented: always return None.
         """
+        return None
 
     def categories(self):
         """
@@ -440,30 +510,16 @@ class Distro(object):
             and an installed package DB format), such as RPM, Alpine, Debian.
           - base OS style such as linux, bsd.
           - some indicative OS family
+
+        Return a new plain dict on each call: this is a shallow copy of the
+        DISTRO_CATEGORIES module constant and its nested dicts, such that
+        callers can modify or serialize it freely. Use DISTRO_CATEGORIES
+        directly to avoid the copy for read-only lookups.
         """
-        return dict(
-            rpm=dict(
-                redhat=('fedora', 'centos', 'rhel', 'amazon',
-                        'scientific', 'oraclelinux',),
-                suse=('opensuse', 'suse', 'sles', 'sled', 'sles_sap',
-                      'opensuse-leap', 'opensuse-tumbleweed',),
-                altlinux=('altlinux',),
-                photon=('photon',),
-                mandriva=('mandriva', 'mageia', 'mandrake', 'open-mandriva'),
-            ),
-            debian=('debian', 'kali', 'linuxmint', 'raspbian', 'ubuntu',),
-            arch=('archlinux', 'antergos', 'manjaro',),
-            slackware=('slackware',),
-            gentoo=('gentoo',),
-            alpine=('alpine',),
-            openwrt=('openwrt', 'lede',),
-            bsd=dict(
-                freebsd=('freebsd',),
-                openbsd=('openbsd',),
-                netbsd=('netbsd',),
-                dragonfly=('dragonfly',),
-            ),
-        )
+        return {
+            category: dict(value) if isinstance(value, dict) else value
+            for category, value in DISTRO_CATEGORIES.items()
+        }
 
     def merge(self, other_distro):
         """
@@ -473,10 +529,12 @@ class Distro(object):
         if TRACE:
             logger.debug(f'merge: {self!r} with: {other_distro!r}')
 
-        existing = self.to_dict()
+        # fields are flat values, lists and mappings: a shallow, non-recursive
+        # copy is enough
+        existing = attr.asdict(self, recurse=False)
         if other_distro:
             other_non_empty = {
-                k: v for k, v in other_distro.to_dict().items()
+                k: v for k, v in attr.asdict(other_distro, recurse=False).items()
                 if v
             }
             existing.update(other_non_empty)
@@ -486,9 +544,93 @@ class Distro(object):
         if TRACE:
             logger.debug(f'merge: merged data: {existing!r}')
 
+        # do not share the id_like list or extra_data mapping across distros
+        existing = {k: copy(v) for k, v in existing.items()}
         return type(self)(**existing)
 
 
+def get_os_release_data(location):
+    """
+    Return a new mapping of data parsed from the os-release file at
+    ``location`` or None if ``location`` is empty or missing.
+    """
+    items = _get_os_release_items(location)
+    if items is None:
+        return
+    return dict(items)
+
+
+@utils.cached_by_file_stat()
+def _get_os_release_items(location):
+    """
+    Return a tuple of (key, value) parsed from the os-release file at
+    ``location``.
+    """
+    return tuple((parse_os_release(location) or {}).items())
+
+
+def parse_os_release(location):
+    """
+    Return a mapping built from an os-release-like file at `location`.
+    This returns the same data as ``commoncode.distro.parse_os_release``.
+
+    See https://www.linux.org/docs/man5/os-release.html
+    """
+    with open(location) as osrl:
+        content = osrl.read()
+
+    data = {}
+    # note: not splitlines() which would also split on form feeds and other
+    # line boundaries that are not line ends when iterating a text file
+    for line in content.split('\n'):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        key, _, value = line.partition('=')
+        data[key.strip()] = dequote(value)
+    return data
+
+
+# characters that have a special meaning for shlex: quotes, escape and whitespace
+SHELL_SPECIAL_CHARS = frozenset('"\'\\ \t\r\n')
+QUOTE_OR_ESCAPE_CHARS = frozenset('"\'\\')
+
+
+def dequote(value):
+    """
+    Return a ``value`` string unquoted and unescaped as a shell would do, with
+    its words joined together. This is the same as ``''.join(shlex.split(value))``
+    but only uses shlex for values that need it.
+
+    For example::
+    >>> dequote('fedora')
+    'fedora'
+    >>> dequote('"Fedora 17 (Beefy Miracle)"')
+    'Fedora 17 (Beefy Miracle)'
+    >>> dequote("'rhel fedora'")
+    'rhel fedora'
+    >>> dequote('rhel fedora')
+    'rhelfedora'
+    >>> dequote('"say \\\\"hi\\\\""')
+    'say "hi"'
+    >>> dequote('')
+    ''
+    """
+    if SHELL_SPECIAL_CHARS.isdisjoint(value):
+        return value
+
+    if (
+        len(value) >= 2
+        and value[0] in '"\''
+        and value[0] == value[-1]
+        and QUOTE_OR_ESCAPE_CHARS.isdisjoint(value[1:-1])
+    ):
+        # a plain quoted value
+        return value[1:-1]
+
+    return ''.join(shlex.split(value))
+
+
 def get_debian_details():
     """
     See /etc/dpkg/origins/ for Debian distro.
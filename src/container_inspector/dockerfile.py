@@ -9,10 +9,13 @@
 import logging
 import operator
 import os
+from itertools import zip_longest
 from os import path
 
 import dockerfile_parse
 
+from container_inspector import utils
+
 TRACE = False
 logger = logging.getLogger(__name__)
 if TRACE:
@@ -30,32 +33,94 @@ def get_dockerfile(location):
     Return a Dockerfile data dictionary if the location is a Dockerfile,
     otherwise return None.
     """
-    fn = path.basename(location)
-    if not 'Dockerfile' in fn:
+    if not _is_dockerfile_name(path.basename(location)):
+        return {}
+
+    df_data = _parse_dockerfile(location)
+    if not df_data:
         return {}
+    return {location: df_data}
+
+
+def _is_dockerfile_name(file_name):
+    """
+    Return True if a ``file_name`` looks like the name of a Dockerfile, e.g.
+    it contains "Dockerfile".
+
+    For example::
+    >>> _is_dockerfile_name('Dockerfile')
+    True
+    >>> _is_dockerfile_name('Dockerfile.alpine')
+    True
+    >>> _is_dockerfile_name('app-Dockerfile')
+    True
+    >>> _is_dockerfile_name('Dockerfile-dev')
+    True
+    >>> _is_dockerfile_name('README.rst')
+    False
+    """
+    return 'Dockerfile' in file_name
 
+
+def _parse_dockerfile(location):
+    """
+    Return a Dockerfile data dictionary for the Dockerfile at ``location`` or
+    None if it cannot be read or parsed. The file name is not checked.
+    """
     if TRACE: logger.debug('Found Dockerfile at: %(location)r' % locals())
 
     try:
-        # TODO: keep comments instead of ignoring them:
-        # assign the comments before an instruction line to a line "comment" attribute
-        # assign end of line comment to the line
-        # assign top of file and  end of file comments to file level comment attribute
-        df = dockerfile_parse.DockerfileParser(location)
-
-        df_data = dict()
-        df_data['location'] = location
-        df_data['base_image'] = df.baseimage
-        df_data['instructions'] = []
-
-        for entry in df.structure:
-            entry = dict([(k, v) for k, v in sorted(entry.items())
-                                 if k in ('instruction', 'startline', 'value',)])
-            df_data['instructions'].append(entry)
-        return {location: df_data}
-    except:
-        if TRACE: logger.debug('Error parsing Dockerfile at: %(location)r' % locals())
-        return {}
+        parsed = _read_dockerfile(location)
+    except OSError:
+        # not cached: the file may be readable on the next call
+        if TRACE: logger.debug('Cannot read Dockerfile at: %(location)r' % locals())
+        return
+
+    if not parsed:
+        return
+
+    base_image, instructions = parsed
+    df_data = dict()
+    df_data['location'] = location
+    df_data['base_image'] = base_image
+    df_data['instructions'] = [
+        {'instruction': instruction, 'startline': startline, 'value': value}
+        for instruction, startline, value in instructions
+    ]
+    return df_data
+
+
+@utils.cached_by_file_stat()
+def _read_dockerfile(location):
+    """
+    Return a tuple of (base_image, instructions) parsed from the Dockerfile at
+    ``location`` where instructions is a tuple of (instruction, startline,
+    value) tuples, or None if it cannot be parsed. Raise an OSError if the file
+    cannot be read.
+    """
+    # TODO: keep comments instead of ignoring them:
+    # assign the comments before an instruction line to a line "comment" attribute
+    # assign end of line comment to the line
+    # assign top of file and  end of file comments to file level comment attribute
+
+    # use a file object because DockerfileParser otherwise only accepts a
+    # file named exactly "Dockerfile"
+    with open(location, 'rb') as fileobj:
+        try:
+            df = dockerfile_parse.DockerfileParser(fileobj=fileobj)
+            base_image = df.baseimage
+            structure = df.structure
+        except OSError:
+            raise
+        except Exception:
+            if TRACE: logger.debug('Error parsing Dockerfile at: %(location)r' % locals())
+            return
+
+    instructions = tuple(
+        (entry['instruction'], entry['startline'], entry['value'])
+        for entry in structure
+    )
+    return base_image, instructions
 
 
 def flatten_dockerfiles(dockerfiles):
@@ -64,13 +129,15 @@ def flatten_dockerfiles(dockerfiles):
     'location', 'base_image', 'order', 'instruction', 'value'
     """
     for loc, df in dockerfiles.items():
+        base_image = df['base_image']
         for order, instruction in enumerate(df['instructions']):
-            ndf = dict(order=order)
-            ndf.update(instruction)
-            del ndf['startline']
-            ndf['location'] = loc
-            ndf['base_image'] = df['base_image']
-            yield ndf
+            yield {
+                'order': order,
+                'instruction': instruction['instruction'],
+                'value': instruction['value'],
+                'location': loc,
+                'base_image': base_image,
+            }
 
 
 def collect_dockerfiles(location):
@@ -79,9 +146,35 @@ def collect_dockerfiles(location):
     Dockerfile data
     """
     dfiles = {}
-    for top, dirs, files in os.walk(location):
-        for f in files:
-            dfiles.update(get_dockerfile(path.join(top, f)))
+    # walk top-down with a stack of directories, in the same order as os.walk
+    # but using the file types cached by os.scandir. Like os.walk, do not
+    # follow symlinks to directories and ignore unreadable directories.
+    stack = [location]
+    while stack:
+        top = stack.pop()
+        try:
+            with os.scandir(top) as entries:
+                entries = list(entries)
+        except OSError:
+            continue
+
+        subdirs = []
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+
+            if is_dir:
+                if not entry.is_symlink():
+                    subdirs.append(entry.path)
+            elif _is_dockerfile_name(entry.name):
+                df_data = _parse_dockerfile(entry.path)
+                if df_data:
+                    dfiles[entry.path] = df_data
+
+        stack.extend(reversed(subdirs))
+
     if TRACE: logger.debug('collect_dockerfiles: %(dfiles)r' % locals())
     return dfiles
 
@@ -122,6 +215,12 @@ INSTRUCTION_MATCHERS = {
     'ONBUILD': operator.eq,
 }
 
+# prefix of a CMD instruction that runs a shell command
+SHELL_PREFIX = '[/bin/sh -c '
+
+# marker of a layer command that does not change the layer files
+NOP_PREFIX = '#(nop) '
+
 
 def normalized_layer_command(layer_command):
     """
@@ -130,32 +229,34 @@ def normalized_layer_command(layer_command):
     they were in the original Dockerfile.
     """
     cmd = layer_command and layer_command.strip() or ''
-    cmd = cmd.replace('#(nop) ', '', 1)
-    cmd = cmd.strip()
+    if cmd.startswith(NOP_PREFIX):
+        cmd = cmd[len(NOP_PREFIX):].lstrip()
+    else:
+        cmd = cmd.replace(NOP_PREFIX, '', 1)
 
     if not cmd:
         instruct = 'FROM'
-        cmd = ''
         return instruct, cmd
 
-    if not cmd.startswith(tuple(INSTRUCTION_MATCHERS)):
+    # an instruction is the first word of the command: this does not match
+    # commands such as "ENVOY" as an "ENV" instruction
+    instruct, _, rest = cmd.partition(' ')
+    if instruct in INSTRUCTION_MATCHERS:
+        # the command has no trailing spaces since it was stripped above
+        cmd = rest.lstrip()
+    else:
         # RUN instructions are not kept
         instruct = 'RUN'
-    else:
-        instruct, _, cmd = cmd.partition(' ')
-        instruct = instruct.strip()
-        cmd = cmd.strip()
 
     if instruct in ('ADD', 'COPY',):
         # normalize ADD and COPY commands
         # #(nop) ADD src/docker/fs/ in /
         cmd = cmd.replace(' in ', ' ', 1)
 
-    shell = '[/bin/sh -c '
-    if instruct == 'CMD' and cmd.startswith(shell):
+    if instruct == 'CMD' and cmd.startswith(SHELL_PREFIX):
         # normalize CMD
         # #(nop) CMD [/bin/sh -c ./opt/bin/startup.sh && supervisord -c /etc/supervisord.conf]
-        cmd = cmd.replace(shell, '', 1)
+        cmd = cmd.replace(SHELL_PREFIX, '', 1)
         cmd = cmd.strip('[]')
 
     return instruct, cmd
@@ -208,17 +309,23 @@ def map_image_to_dockerfile(image, dockerfile):
     commands. If aligned, the Dockerfile was used to create the corresponding
     Image layers.
     """
-    # collect and remove the FROM image instruction of the dockerfile
+    # collect and skip the FROM image instruction of the dockerfile
     # because it never exists in the layers
-    from_base = dockerfile['instructions'].pop(0)
+    instructions = dockerfile['instructions']
+    if not instructions:
+        raise CannotAlignImageToDockerfileError('Dockerfile has no instructions')
+    from_base = instructions[0]
     from_image_instruction = from_base['instruction']
-    assert from_image_instruction == 'FROM'
+    if from_image_instruction != 'FROM':
+        msg = ('Dockerfile first instruction is not FROM: '
+               '%(from_image_instruction)r' % locals())
+        raise CannotAlignImageToDockerfileError(msg)
     from_image_startline = from_base['startline']
     from_image_name_tag = from_base['value'].strip()
     from_image_name, _, from_image_tag = from_image_name_tag.partition(':')
 
-    # align layers and dockerfile lines, from top to bottom
-    aligned = map(None, reversed(image.layers), reversed(dockerfile['instructions']))
+    # align layers and dockerfile lines, from top to bottom, without the FROM
+    aligned = zip_longest(reversed(image.layers), instructions[:0:-1])
 
     # TODO: keep track of original image for these layers
     base_image_layers = []
@@ -231,7 +338,12 @@ def map_image_to_dockerfile(image, dockerfile):
             base_image_layers.append(layer)
             continue
 
-        layer_instruct, layer_cmd = normalized_layer_command(layer.command)
+        if not layer:
+            msg = ('Dockerfile has more instructions than the image has layers: '
+                   'order=%(order)d' % locals())
+            raise CannotAlignImageToDockerfileError(msg)
+
+        layer_instruct, layer_cmd = normalized_layer_command(layer.created_by)
         dckrfl_instruct, dckrfl_startline, dckrfl_cmd = dockerfile_instruct.values()
 
         # verify command and instruction
@@ -6,8 +6,10 @@
 # See https://aboutcode.org for more information about nexB OSS projects.
 #
 
+import hashlib
 import logging
 import os
+import sys
 
 import attr
 
@@ -24,7 +26,6 @@ from container_inspector.utils import sha256_digest
 TRACE = False
 logger = logging.getLogger(__name__)
 if TRACE:
-    import sys
     logging.basicConfig(level=logging.DEBUG, stream=sys.stdout)
     logger.setLevel(logging.DEBUG)
 
@@ -79,15 +80,6 @@ def flatten_images_data(images, layer_path_segments=0, _test=False):
         )
 
         for layer in img.layers:
-            layer_data = dict(base_data)
-            layer_data['is_empty_layer'] = layer.is_empty_layer
-            layer_data['layer_id'] = layer.layer_id
-            layer_data['layer_sha256'] = layer.sha256
-            layer_data['author'] = layer.author
-            layer_data['created_by'] = layer.created_by
-            layer_data['created'] = layer.created
-            layer_data['comment'] = layer.comment
-
             lay_extracted_location = layer.extracted_location
             lay_archive_location = layer.archive_location
 
@@ -101,9 +93,18 @@ def flatten_images_data(images, layer_path_segments=0, _test=False):
                     num_segments=layer_path_segments,
                 )
 
-            layer_data['layer_archive_location'] = lay_archive_location
-            layer_data['layer_extracted_location'] = lay_extracted_location
-            yield layer_data
+            yield {
+                **base_data,
+                'is_empty_layer': layer.is_empty_layer,
+                'layer_id': layer.layer_id,
+                'layer_sha256': layer.sha256,
+                'author': layer.author,
+                'created_by': layer.created_by,
+                'created': layer.created,
+                'comment': layer.comment,
+                'layer_archive_location': lay_archive_location,
+                'layer_extracted_location': lay_extracted_location,
+            }
 
 
 def get_trimmed_path(location, num_segments=2):
@@ -188,10 +189,17 @@ class ConfigMixin(object):
         Return a mapping of `data` suitable to use as kwargs from a layer or an
         image config data mapping.
         """
-        data = utils.lower_keys(data)
-
-        config = data.get('config', {})
-        container_config = data.get('container_config', {})
+        # only lowercase the top level keys: the nested rootfs, history and
+        # other large subtrees are not used here
+        data = {key.lower(): value for key, value in data.items()}
+
+        # get_labels lowercases the config and container_config keys
+        config = data.get('config') or {}
+        container_config = data.get('container_config') or {}
+        author = next(
+            (value for key, value in config.items() if key.lower() == 'author'),
+            None,
+        )
 
         return dict(
             docker_version=data.get('docker_version'),
@@ -200,7 +208,7 @@ class ConfigMixin(object):
             architecture=data.get('architecture'),
             variant=data.get('variant'),
             created=data.get('created'),
-            author=config.get('author'),
+            author=author,
             comment=data.get('comment'),
             labels=utils.get_labels(config, container_config),
         )
@@ -709,13 +717,18 @@ class Image(ArchiveMixin, ConfigMixin):
             raise Exception(
                 f'Invalid configuration. Missing Config file: {config_file_loc}')
 
+        # read the config once to both verify and parse it
+        with open(config_file_loc, 'rb') as cf:
+            config_content = cf.read()
+
         image_id, _ = os.path.splitext(os.path.basename(config_file_loc))
-        config_digest = sha256_digest(config_file_loc)
-        if verify and image_id != as_bare_id(config_digest):
-            raise Exception(
-                f'Image config {config_file_loc} SHA256:{image_id} is not '
-                f'consistent with actual computed value SHA256: {config_digest}'
-            )
+        if verify:
+            config_sha256 = hashlib.sha256(config_content).hexdigest()
+            if image_id != config_sha256:
+                raise Exception(
+                    f'Image config {config_file_loc} SHA256:{image_id} is not '
+                    f'consistent with actual computed value SHA256: {config_sha256}'
+                )
 
         config_digest = f'sha256:{image_id}'
 
@@ -734,8 +747,11 @@ class Image(ArchiveMixin, ConfigMixin):
 
         tags = manifest_config.get('repotags') or []
 
-        image_config = utils.lower_keys(load_json(config_file_loc))
-        rootfs = image_config['rootfs']
+        # only lowercase the keys used here: from_config_data takes care of
+        # the config and container_config subtrees
+        image_config = utils.loads_json(config_content)
+        image_config = {key.lower(): value for key, value in image_config.items()}
+        rootfs = utils.lower_keys(image_config['rootfs'])
         rt = rootfs['type']
         if rt != 'layers':
             raise Exception(
@@ -747,15 +763,20 @@ class Image(ArchiveMixin, ConfigMixin):
         # diff for an empty layer with a digest for some EMPTY content e.g.
         # e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855
 
-        layers_sha256s = [as_bare_id(lsha256)
+        # layers are often shared by several images: intern their digests
+        layers_sha256s = [sys.intern(as_bare_id(lsha256))
                           for lsha256 in rootfs['diff_ids']]
-        layer_arch_locs_and_sha256s = zip(layers_archive_locs, layers_sha256s)
+        layer_arch_locs_and_sha256s = list(
+            zip(layers_archive_locs, layers_sha256s))
 
-        layers = []
-        for layer_archive_loc, layer_sha256 in layer_arch_locs_and_sha256s:
+        if verify:
+            # hash all the layer archives at once, in parallel
+            on_disk_layers_sha256s = utils.sha256_digests(
+                loc for loc, _ in layer_arch_locs_and_sha256s)
 
-            if verify:
-                on_disk_layer_sha256 = sha256_digest(layer_archive_loc)
+            for (layer_archive_loc, layer_sha256), on_disk_layer_sha256 in zip(
+                layer_arch_locs_and_sha256s, on_disk_layers_sha256s,
+            ):
                 if layer_sha256 != on_disk_layer_sha256:
                     raise Exception(
                         f'Layer archive: SHA256:{on_disk_layer_sha256}\n at '
@@ -763,10 +784,10 @@ class Image(ArchiveMixin, ConfigMixin):
                         f'its "diff_id": SHA256:{layer_sha256}'
                     )
 
-            layers.append(Layer(
-                archive_location=layer_archive_loc,
-                sha256=layer_sha256,
-            ))
+        layers = [
+            Layer(archive_location=layer_archive_loc, sha256=layer_sha256)
+            for layer_archive_loc, layer_sha256 in layer_arch_locs_and_sha256s
+        ]
 
         history = image_config.get('history') or {}
         assign_history_to_layers(history, layers)
@@ -917,7 +938,7 @@ class Image(ArchiveMixin, ConfigMixin):
             layers = []
             for layer in manifest['layers']:
                 layer_digest = layer['digest']
-                layer_sha256 = as_bare_id(layer_digest)
+                layer_sha256 = sys.intern(as_bare_id(layer_digest))
                 layer_arch_loc = get_oci_blob(
                     extracted_location, layer_sha256, verify=verify)
                 layers.append(Layer(
@@ -1004,7 +1025,7 @@ def assign_history_to_layers(history, layers):
                 setattr(layer, field, value)
 
 
-@attr.attributes
+@attr.attributes(slots=True)
 class Resource:
     path = attr.attrib(
         default=None,
@@ -6,10 +6,16 @@
 # See https://aboutcode.org for more information about nexB OSS projects.
 #
 
+import errno
 import logging
 import os
+import stat
 import tempfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 
+from commoncode.fileutils import copyfile
 from commoncode.fileutils import copytree
 from commoncode.fileutils import delete
 from commoncode.paths import split
@@ -31,21 +37,28 @@ class InconsistentLayersError(Exception):
     pass
 
 
-def rebuild_rootfs(img, target_dir, skip_symlinks=True):
+# maximum number of layers extracted ahead in parallel when rebuilding a rootfs
+MAX_EXTRACT_WORKERS = 4
+
+
+def rebuild_rootfs(img, target_dir, skip_symlinks=True, max_workers=None):
     """
     Extract and merge or "squash" all layers of the `image` Image in a single
-    rootfs in `target_dir`. Extraction is done in sequence from the bottom (root
+    rootfs in `target_dir`. Layers are merged in sequence from the bottom (root
     or initial) layer to the top (or latest) layer and the "whiteouts"
     unionfs/overlayfs procedure is applied at each step as per the OCI spec:
     https://github.com/opencontainers/image-spec/blob/master/layer.md#whiteouts
 
     Skip symlinks and links if ``skip_symlinks`` is True.
 
+    Up to ``max_workers`` layers are extracted ahead in parallel threads, but
+    layers are always merged one at a time in order.
+
     Return a list of deleted "whiteout" files.
     Raise an Exception on errrors.
 
     The extraction process consists of these steps:
-     - extract the layer in a temp directory
+     - extract the layer in a temp directory (possibly ahead of time)
      - find whiteouts in that layer temp dir
      - remove files/directories corresponding to these whiteouts in the target directory
      - remove whiteouts special marker files or dirs in the tempdirectory
@@ -61,64 +74,176 @@ def rebuild_rootfs(img, target_dir, skip_symlinks=True):
     https://github.com/moby/moby/blob/master/image/spec/v1.2.md
     """
 
-    assert os.path.isdir(target_dir)
+    if not os.path.isdir(target_dir):
+        raise Exception(f'target_dir is not a directory: {target_dir}')
+
+    if not max_workers:
+        max_workers = min(MAX_EXTRACT_WORKERS, os.cpu_count() or 1)
+
+    # extract layers next to target_dir such that their files can be moved
+    # rather than copied to target_dir
+    temp_dir = os.path.dirname(os.path.abspath(target_dir))
 
     # log  deletions
     deletions = []
 
-    for layer_num, layer in enumerate(img.layers):
-        if TRACE:
-            logger.debug(
-                f'Extracting layer {layer_num} - {layer.layer_id} '
-                f'tarball: {layer.archive_location}'
-            )
+    layers = iter(enumerate(img.layers))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # extract a few layers ahead: only a bounded number of extracted layers
+        # are waiting on disk to be merged at any time
+        pending = deque(
+            executor.submit(
+                _extract_layer, layer_num, layer, skip_symlinks, temp_dir)
+            for layer_num, layer in islice(layers, max_workers)
+        )
+
+        try:
+            while pending:
+                # 1. get the next layer extracted to temp, in order.
+                extracted_loc = pending.popleft().result()
+
+                for layer_num, layer in islice(layers, 1):
+                    pending.append(executor.submit(
+                        _extract_layer, layer_num, layer, skip_symlinks, temp_dir))
+
+                try:
+                    deletions.extend(merge_layer(extracted_loc, target_dir))
+                finally:
+                    # merge_layer deletes extracted_loc unless it failed
+                    delete(extracted_loc)
+        finally:
+            # on errors, do not leave extracted layers behind
+            for future in pending:
+                if not future.cancel() and not future.exception():
+                    delete(future.result())
+
+    return deletions
+
 
-        # 1. extract a layer to temp.
-        # Note that we are not preserving any special file and any file permission
+def _extract_layer(layer_num, layer, skip_symlinks=True, temp_dir=None):
+    """
+    Extract the ``layer`` Layer in a new temporary directory created in
+    ``temp_dir`` if possible and return this directory location.
+    """
+    if TRACE:
+        logger.debug(
+            f'Extracting layer {layer_num} - {layer.layer_id} '
+            f'tarball: {layer.archive_location}'
+        )
+
+    # Note that we are not preserving any special file and any file permission
+    try:
+        extracted_loc = tempfile.mkdtemp('container_inspector-docker', dir=temp_dir)
+    except OSError:
         extracted_loc = tempfile.mkdtemp('container_inspector-docker')
-        # TODO: do not ignore extract events
+    # TODO: do not ignore extract events
+    try:
         _events = layer.extract(
             extracted_location=extracted_loc,
             skip_symlinks=skip_symlinks,
         )
-        if TRACE:
-            logger.debug(
-                f'  Extracted layer to: {extracted_loc} with skip_symlinks: {skip_symlinks}')
-            for ev in _events:
-                logger.debug(f'  {ev}')
+    except Exception:
+        # do not leave a partially extracted layer behind
+        delete(extracted_loc)
+        raise
+    if TRACE:
+        logger.debug(
+            f'  Extracted layer to: {extracted_loc} with skip_symlinks: {skip_symlinks}')
+        for ev in _events:
+            logger.debug(f'  {ev}')
+    return extracted_loc
 
-        # 2. find whiteouts in that layer.
-        whiteouts = list(find_whiteouts(extracted_loc))
-        if TRACE:
-            logger.debug(
-                '  Merging extracted layers and applying unionfs whiteouts')
-        if TRACE:
-            logger.debug('  Whiteouts:\n' +
-                         '     \n'.join(map(repr, whiteouts)))
 
-        # 3. remove whiteouts in the previous layer stack (e.g. the WIP rootfs)
-        for whiteout_marker_loc, whiteable_path in whiteouts:
-            if TRACE:
-                logger.debug(
-                    f'    Deleting dir or file with whiteout marker: {whiteout_marker_loc}')
-            whiteable_loc = os.path.join(target_dir, whiteable_path)
-            delete(whiteable_loc)
-            # also delete the whiteout marker file
-            delete(whiteout_marker_loc)
-            deletions.append(whiteable_loc)
-
-        # 4. finall copy/overwrite the extracted layer over the WIP rootfs
+def merge_layer(extracted_loc, target_dir):
+    """
+    Merge the extracted layer at ``extracted_loc`` in the WIP rootfs at
+    ``target_dir``, applying the whiteouts of this layer and deleting
+    ``extracted_loc`` afterwards. Return a list of deleted "whiteout" files.
+    """
+    deletions = []
+
+    # 2. find whiteouts in that layer.
+    whiteouts = list(find_whiteouts(extracted_loc))
+    if TRACE:
+        logger.debug(
+            '  Merging extracted layers and applying unionfs whiteouts')
+    if TRACE:
+        logger.debug('  Whiteouts:\n' +
+                     '     \n'.join(map(repr, whiteouts)))
+
+    # 3. remove whiteouts in the previous layer stack (e.g. the WIP rootfs)
+    for whiteout_marker_loc, whiteable_path in whiteouts:
         if TRACE:
             logger.debug(
-                f'  Moving extracted layer from: {extracted_loc} to: {target_dir}')
-        copytree(extracted_loc, target_dir)
-        if TRACE:
-            logger.debug(f'  Moved layer to: {target_dir}')
-        delete(extracted_loc)
+                f'    Deleting dir or file with whiteout marker: {whiteout_marker_loc}')
+        whiteable_loc = os.path.join(target_dir, whiteable_path)
+        delete(whiteable_loc)
+        # also delete the whiteout marker file
+        delete(whiteout_marker_loc)
+        deletions.append(whiteable_loc)
+
+    # 4. finall move/overwrite the extracted layer over the WIP rootfs
+    if TRACE:
+        logger.debug(
+            f'  Moving extracted layer from: {extracted_loc} to: {target_dir}')
+    move_tree(extracted_loc, target_dir)
+    if TRACE:
+        logger.debug(f'  Moved layer to: {target_dir}')
+    delete(extracted_loc)
 
     return deletions
 
 
+def move_tree(src, dst):
+    """
+    Move recursively the files of the `src` directory to the `dst` directory,
+    overwriting existing files and directories in `dst`. Files and directories
+    are renamed and only copied if `src` and `dst` are on different
+    filesystems.
+
+    A directory that does not exist yet in `dst` is renamed as a whole with
+    its content. A directory that exists in `dst` is merged file by file and
+    gets the timestamps and permissions of the `src` directory.
+    Like ``commoncode.fileutils.copytree``, ignore symlinks and special files
+    in merged directories.
+    """
+    if not os.path.exists(dst):
+        os.makedirs(dst)
+
+    for entry in os.scandir(src):
+        dst_loc = os.path.join(dst, entry.name)
+
+        if entry.is_dir(follow_symlinks=False):
+            if os.path.isdir(dst_loc):
+                # like shutil.copystat, but with the stat taken before moving
+                # files out of the src directory changes its timestamps
+                src_stat = entry.stat(follow_symlinks=False)
+                move_tree(entry.path, dst_loc)
+                os.chmod(dst_loc, stat.S_IMODE(src_stat.st_mode))
+                os.utime(dst_loc, ns=(src_stat.st_atime_ns, src_stat.st_mtime_ns))
+                continue
+
+            # a directory replaces a file or is new
+            delete(dst_loc)
+            try:
+                os.replace(entry.path, dst_loc)
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    raise
+                copytree(entry.path, dst_loc)
+
+        elif entry.is_file(follow_symlinks=False):
+            if os.path.isdir(dst_loc):
+                # a file replaces a directory
+                delete(dst_loc)
+            try:
+                os.replace(entry.path, dst_loc)
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    raise
+                copyfile(entry.path, dst_loc)
+
+
 WHITEOUT_PREFIX = '.wh.'
 WHITEOUT_SPECIAL_PREFIX = '.wh..wh'
 WHITEOUT_OPAQUE_PREFIX = '.wh..wh..opq'
@@ -225,6 +350,9 @@ def find_whiteouts(root_location, walker=os.walk):
     """
     for top, _dirs, files in walker(root_location):
         for fil in files:
+            # most files are not whiteouts: skip these early
+            if not fil.startswith(WHITEOUT_PREFIX):
+                continue
             whiteout_marker_loc = os.path.join(top, fil)
             whiteable_path = get_whiteable_path(whiteout_marker_loc)
             if whiteable_path:
@@ -11,10 +11,20 @@ import logging
 import hashlib
 import os
 import traceback
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from functools import partial
+from functools import wraps
 from typing import NamedTuple
 
 from commoncode import fileutils
 
+try:
+    # optional, faster JSON parser
+    import orjson
+except ImportError:
+    orjson = None
+
 TRACE = False
 
 logger = logging.getLogger(__name__)
@@ -27,11 +37,32 @@ if TRACE:
 def load_json(location):
     """
     Return the data loaded from a JSON file at `location`.
-    Ensure that the mapping are ordered.
+    Mappings are plain dicts and keep the order of the JSON file keys.
+    Use orjson when it is installed and fall back to the standard json module.
+    """
+    with open(location, 'rb') as loc:
+        content = loc.read()
+    return loads_json(content)
+
+
+def loads_json(content):
     """
-    with open(location) as loc:
-        data = json.load(loc)
-    return data
+    Return the data loaded from a JSON ``content`` bytes or string.
+    Use orjson when it is installed and fall back to the standard json module.
+
+    For example::
+    >>> loads_json(b'{"Foo": [1, 2]}')
+    {'Foo': [1, 2]}
+    """
+    if orjson:
+        try:
+            return orjson.loads(content)
+        except orjson.JSONDecodeError:
+            # orjson is stricter than json for some inputs (such as NaN,
+            # large integers or non-UTF-8 encodings): retry with json
+            pass
+
+    return json.loads(content)
 
 
 def get_command(cmds):
@@ -45,24 +76,106 @@ def get_command(cmds):
     return ' '.join(cmds)
 
 
+# Size of the chunks read from a file when computing its checksum. Large chunks
+# mean fewer calls to feed the hash function, while keeping memory flat for
+# large layer archives.
+HASH_CHUNK_SIZE = 4 * 1024 * 1024
+
+
+def cached_by_file_stat(maxsize=1024):
+    """
+    Return a decorator that caches the results of a ``function(location)``
+    reading the file at ``location``. Results are cached by absolute path,
+    device, inode, modification time and size, so a file is read again only
+    when it changes. Cached results are shared and should be immutable.
+
+    The decorated function returns None if ``location`` is empty or cannot be
+    stat'ed, and is called with the absolute ``location``. Exceptions are
+    not cached.
+    """
+
+    def decorator(function):
+
+        @lru_cache(maxsize=maxsize)
+        def cached(location, dev, ino, mtime_ns, size):
+            return function(location)
+
+        @wraps(function)
+        def wrapper(location):
+            if not location:
+                return
+            try:
+                stat = os.stat(location)
+            except OSError:
+                return
+            return cached(
+                os.path.abspath(location),
+                stat.st_dev,
+                stat.st_ino,
+                stat.st_mtime_ns,
+                stat.st_size,
+            )
+
+        wrapper.cache_clear = cached.cache_clear
+        return wrapper
+
+    return decorator
+
+
+@cached_by_file_stat(maxsize=4096)
 def sha256_digest(location):
     """
     Return a SHA256 checksum for the file content at location.
     """
-    if location and os.path.exists(location):
-        with open(location, 'rb') as loc:
-            sha256 = hashlib.sha256(loc.read())
-        return str(sha256.hexdigest())
+    sha256 = hashlib.sha256()
+    with open(location, 'rb', buffering=0) as loc:
+        # read in the same buffer over and over rather than allocating a new
+        # bytes object for each chunk. Do not allocate a large buffer for a
+        # small file.
+        file_size = os.fstat(loc.fileno()).st_size
+        buffer = memoryview(bytearray(min(HASH_CHUNK_SIZE, file_size or 1)))
+        if hasattr(os, 'posix_fadvise'):
+            # tell the kernel we read the whole file once, front to back, so it
+            # reads ahead more aggressively
+            try:
+                os.posix_fadvise(loc.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            except OSError:
+                pass
+        for read_size in iter(partial(loc.readinto, buffer), 0):
+            sha256.update(buffer[:read_size])
+    return str(sha256.hexdigest())
+
+
+def sha256_digests(locations, max_workers=None):
+    """
+    Return a list of SHA256 checksums for the file content at each location of
+    a ``locations`` list, in the same order. Files are hashed in parallel using
+    up to ``max_workers`` threads (hashlib releases the GIL when hashing).
+    """
+    locations = list(locations)
+    if len(locations) < 2:
+        return [sha256_digest(loc) for loc in locations]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(sha256_digest, locations))
+
+
+SHA256_PREFIX = 'sha256:'
 
 
 def as_bare_id(string):
     """
     Return an id stripped from its leading checksum algorithm prefix if present.
+
+    For example::
+    >>> as_bare_id('sha256:5f70bf18a086007016e948b04aed3b82103a36be')
+    '5f70bf18a086007016e948b04aed3b82103a36be'
+    >>> as_bare_id('5f70bf18a086007016e948b04aed3b82103a36be')
+    '5f70bf18a086007016e948b04aed3b82103a36be'
+    >>> as_bare_id(None)
     """
-    if not string:
-        return string
-    if string.startswith('sha256:'):
-        _, _, string = string.partition('sha256:')
+    if string and string.startswith(SHA256_PREFIX):
+        return string[len(SHA256_PREFIX):]
     return string
 
 
@@ -74,11 +187,11 @@ def get_labels(config, container_config):
     labels = {}
 
     config = lower_keys(config)
-    config_labels = config.get('labels', {}) or {}
+    config_labels = config.get('labels') or {}
     labels.update(config_labels.items())
 
     container_config = lower_keys(container_config)
-    container_labels = container_config.get('labels', {}) or {}
+    container_labels = container_config.get('labels') or {}
     labels.update(container_labels.items())
     return dict(sorted(labels.items()))
 
@@ -7,6 +7,7 @@
 #
 
 import os
+import csv
 import json
 
 from commoncode.testcase import FileBasedTesting
@@ -66,6 +67,29 @@ class TestContainerInspectorCli(FileBasedTesting):
         result = clean_images_data(json.loads(out))
         check_expected(result, expected, regen=False)
 
+    def test_container_inspector_multiple_layers_from_dir_as_csv(self):
+        test_dir = self.extract_test_tar('cli/she-image_from_scratch-1.0.tar')
+        out = cli._container_inspector(image_path=test_dir, csv=True)
+        rows = list(csv.DictReader(out.splitlines()))
+        images = json.loads(cli._container_inspector(image_path=test_dir))
+        layers = [layer for image in images for layer in image['layers']]
+        assert [r['layer_id'] for r in rows] == [l['layer_id'] for l in layers]
+        assert list(rows[0]) == [
+            'image_extracted_location',
+            'image_archive_location',
+            'image_id',
+            'image_tags',
+            'is_empty_layer',
+            'layer_id',
+            'layer_sha256',
+            'author',
+            'created_by',
+            'created',
+            'comment',
+            'layer_archive_location',
+            'layer_extracted_location',
+        ]
+
     def test_squash_single_layer(self):
         test_dir = self.extract_test_tar('cli/hello-world.tar')
         target_dir = self.get_temp_dir()
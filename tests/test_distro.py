@@ -6,12 +6,16 @@
 # See https://aboutcode.org for more information about nexB OSS projects.
 #
 
+import json
 import os
 
+from commoncode import distro as commoncode_distro
 from commoncode.testcase import FileBasedTesting
 from commoncode.fileutils import resource_iter
 
 from container_inspector.distro import Distro
+from container_inspector.distro import get_os_release_data
+from container_inspector.distro import parse_os_release
 
 from utilities import check_expected
 
@@ -29,6 +33,15 @@ class TestDistro(FileBasedTesting):
             result = Distro.from_os_release_file(test_file).to_dict()
             check_expected(result, expected, regen=False)
 
+    def test_parse_os_release_is_the_same_as_commoncode(self):
+        test_dir = self.get_test_loc('distro/os-release')
+
+        for test_file in resource_iter(test_dir, with_dirs=False):
+            if test_file.endswith('-expected.json'):
+                continue
+            expected = commoncode_distro.parse_os_release(test_file)
+            assert parse_os_release(test_file) == expected, test_file
+
     def test_distro_from_os_release_returns_None_on_empty_or_missing_location(self):
         assert Distro.from_os_release_file('') is None
         assert Distro.from_os_release_file(None) is None
@@ -39,6 +52,34 @@ class TestDistro(FileBasedTesting):
         except:
             pass
 
+    def test_get_os_release_data_returns_fresh_data_when_file_changes(self):
+        test_file = os.path.join(self.get_temp_dir(), 'os-release')
+        with open(test_file, 'w') as osr:
+            osr.write('ID=alpine\n')
+        data = get_os_release_data(test_file)
+        assert data == {'ID': 'alpine'}
+        # returned data are a copy that can be modified
+        data.pop('ID')
+        assert get_os_release_data(test_file) == {'ID': 'alpine'}
+
+        with open(test_file, 'w') as osr:
+            osr.write('ID=debian\nVERSION_ID="11"\n')
+        assert get_os_release_data(test_file) == {'ID': 'debian', 'VERSION_ID': '11'}
+
+    def test_distro_find_linux_details_uses_etc_then_usr_lib_os_release(self):
+        test_dir = self.get_temp_dir()
+        assert Distro.find_linux_details(test_dir) is None
+
+        os.makedirs(os.path.join(test_dir, 'usr', 'lib'))
+        with open(os.path.join(test_dir, 'usr', 'lib', 'os-release'), 'w') as osr:
+            osr.write('ID=debian\n')
+        assert Distro.find_linux_details(test_dir).identifier == 'debian'
+
+        os.makedirs(os.path.join(test_dir, 'etc'))
+        with open(os.path.join(test_dir, 'etc', 'os-release'), 'w') as osr:
+            osr.write('ID=distroless\n')
+        assert Distro.find_linux_details(test_dir).identifier == 'distroless'
+
     def test_distro_from_rootfs_returns_None_on_empty_or_missing_location(self):
         assert Distro.from_rootfs('') is None
         assert Distro.from_rootfs(None) is None
@@ -80,6 +121,26 @@ class TestDistro(FileBasedTesting):
         results = {k: v for k, v in sorted(distro.to_dict().items()) if v}
         assert results == expected
 
+    def test_distro_merge_uses_non_empty_values_and_copies(self):
+        base = Distro(os='linux', architecture='amd64', id_like=['rhel'])
+        other = Distro(identifier='centos', architecture='', extra_data={'a': 'b'})
+        merged = base.merge(other)
+        assert merged.os == 'linux'
+        assert merged.architecture == 'amd64'
+        assert merged.identifier == 'centos'
+        assert merged.id_like == ['rhel']
+        assert merged.extra_data == {'a': 'b'}
+        assert merged.id_like is not base.id_like
+        assert merged.extra_data is not other.extra_data
+
+    def test_distro_categories_returns_new_plain_dicts(self):
+        categories = Distro().categories()
+        assert type(categories) is dict
+        assert type(categories['rpm']) is dict
+        assert json.loads(json.dumps(categories))['debian'][0] == 'debian'
+        categories['rpm'].clear()
+        assert Distro().categories()['rpm']
+
     def test_distro_from_rootfs_raise_exception_if_different_base_distro_os(self):
         base = Distro(os='freebsd')
         test_dir = self.extract_test_tar('distro/windows-container-rootfs.tar')
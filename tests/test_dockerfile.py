@@ -7,9 +7,16 @@
 #
 
 import os
+from types import SimpleNamespace
+from unittest import mock
 
 from commoncode.testcase import FileBasedTesting
 
+from container_inspector.dockerfile import CannotAlignImageToDockerfileError
+from container_inspector.dockerfile import collect_dockerfiles
+from container_inspector.dockerfile import flatten_dockerfiles
+from container_inspector.dockerfile import get_dockerfile
+from container_inspector.dockerfile import map_image_to_dockerfile
 from container_inspector.dockerfile import normalized_layer_command
 
 
@@ -37,6 +44,109 @@ class TestDockerfile(FileBasedTesting):
             ('#(nop) VOLUME ["/var/log", "/usr/local/pgsql/data"]',
              ('VOLUME', '["/var/log", "/usr/local/pgsql/data"]')),
             ('#(nop) WORKDIR /', ('WORKDIR', '/')),
+            ('ENVOY_VERSION=1.2 ./install.sh', ('RUN', 'ENVOY_VERSION=1.2 ./install.sh')),
+            ('/bin/sh -c #(nop) WORKDIR /', ('RUN', '/bin/sh -c WORKDIR /')),
+            ('#(nop) ONBUILD', ('ONBUILD', '')),
+            ('CMD', ('CMD', '')),
+            ('FROM', ('FROM', '')),
+            ('ENVOY', ('RUN', 'ENVOY')),
         ]
         for layer_command, expected in test_data:
             assert expected == normalized_layer_command(layer_command)
+
+    def test_collect_dockerfiles(self):
+        test_dir = self.get_temp_dir()
+        for subdir in ('', 'foo', 'foo/bar', 'baz'):
+            os.makedirs(os.path.join(test_dir, subdir), exist_ok=True)
+            with open(os.path.join(test_dir, subdir, 'Dockerfile'), 'w') as df:
+                df.write('FROM scratch\nADD hello /\n')
+        # any name that contains Dockerfile is collected
+        for name in ('app-Dockerfile', 'Dockerfile-dev', 'README'):
+            with open(os.path.join(test_dir, 'baz', name), 'w') as df:
+                df.write('FROM scratch\n')
+        # symlinked directories are not followed
+        os.symlink(os.path.join(test_dir, 'foo'), os.path.join(test_dir, 'qux'))
+
+        results = collect_dockerfiles(test_dir)
+        results = [path.replace(test_dir, '') for path in results]
+        expected = [
+            '/Dockerfile',
+            '/baz/Dockerfile',
+            '/baz/Dockerfile-dev',
+            '/baz/app-Dockerfile',
+            '/foo/Dockerfile',
+            '/foo/bar/Dockerfile',
+        ]
+        assert expected == sorted(results)
+
+    def test_get_dockerfile_with_suffixed_name(self):
+        test_file = self.get_test_loc('image_templates/Dockerfile.scratch')
+        result = get_dockerfile(test_file)
+        assert list(result) == [test_file]
+        df_data = result[test_file]
+        assert df_data['base_image'] == 'scratch'
+        assert df_data['instructions'][0] == {
+            'instruction': 'FROM', 'startline': 0, 'value': 'scratch'}
+
+    def test_flatten_dockerfiles(self):
+        test_file = self.get_test_loc('image_templates/Dockerfile.scratch')
+        results = list(flatten_dockerfiles(get_dockerfile(test_file)))
+        assert len(results) == 8
+        expected = {
+            'order': 2,
+            'instruction': 'ADD',
+            'value': 'hello /',
+            'location': test_file,
+            'base_image': 'scratch',
+        }
+        assert results[2] == expected
+        assert list(results[2]) == list(expected)
+
+    def test_map_image_to_dockerfile(self):
+        dockerfile = {
+            'instructions': [
+                {'instruction': 'FROM', 'startline': 0, 'value': 'busybox'},
+                {'instruction': 'WORKDIR', 'startline': 1, 'value': '/'},
+            ]
+        }
+        base_layer = SimpleNamespace(created_by='#(nop) ADD file:8ec69d882e7f in /')
+        layer = SimpleNamespace(created_by='#(nop) WORKDIR /')
+        image = SimpleNamespace(layers=[base_layer, layer])
+        map_image_to_dockerfile(image, dockerfile)
+        # the Dockerfile is not modified
+        assert len(dockerfile['instructions']) == 2
+
+        image = SimpleNamespace(layers=[])
+        try:
+            map_image_to_dockerfile(image, dockerfile)
+            self.fail('Exception not raised')
+        except CannotAlignImageToDockerfileError as e:
+            assert str(e).startswith('Dockerfile has more instructions')
+
+    def test_get_dockerfile_returns_fresh_data_when_file_changes(self):
+        test_file = os.path.join(self.get_temp_dir(), 'Dockerfile')
+        with open(test_file, 'w') as df:
+            df.write('FROM scratch\nADD hello /\n')
+        result1 = get_dockerfile(test_file)[test_file]
+        # returned data are not shared with the cache
+        result1['instructions'].pop()
+        result2 = get_dockerfile(test_file)[test_file]
+        assert len(result2['instructions']) == 2
+
+        with open(test_file, 'w') as df:
+            df.write('FROM busybox\n')
+        result3 = get_dockerfile(test_file)[test_file]
+        assert result3['base_image'] == 'busybox'
+        assert len(result3['instructions']) == 1
+
+    def test_get_dockerfile_does_not_cache_read_errors(self):
+        test_file = os.path.join(self.get_temp_dir(), 'Dockerfile')
+        with open(test_file, 'w') as df:
+            df.write('FROM scratch\n')
+
+        parser = 'container_inspector.dockerfile.dockerfile_parse.DockerfileParser'
+        with mock.patch(parser, side_effect=PermissionError):
+            assert get_dockerfile(test_file) == {}
+
+        result = get_dockerfile(test_file)[test_file]
+        assert result['base_image'] == 'scratch'
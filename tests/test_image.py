@@ -10,6 +10,7 @@ import os
 
 from commoncode.testcase import FileBasedTesting
 
+from container_inspector.image import ConfigMixin
 from container_inspector.image import Image
 from container_inspector.image import flatten_images_data
 
@@ -30,6 +31,30 @@ class TestImages(FileBasedTesting):
         test_dir = self.get_temp_dir()
         Image(extracted_location=test_dir)
 
+    def test_ConfigMixin_from_config_data_with_null_configs(self):
+        data = {
+            'os': 'linux',
+            'Config': None,
+            'container_config': {'Labels': None},
+        }
+        result = ConfigMixin.from_config_data(data)
+        assert result['os'] == 'linux'
+        assert result['author'] is None
+        assert result['labels'] == {}
+
+    def test_ConfigMixin_from_config_data_with_mixed_case_keys(self):
+        data = {
+            'OS': 'linux',
+            'Architecture': 'amd64',
+            'Config': {'Author': 'joe', 'Labels': {'Foo': 'bar'}},
+            'RootFS': {'Type': 'layers', 'Diff_IDs': []},
+        }
+        result = ConfigMixin.from_config_data(data)
+        assert result['os'] == 'linux'
+        assert result['architecture'] == 'amd64'
+        assert result['author'] == 'joe'
+        assert result['labels'] == {'foo': 'bar'}
+
     def test_Image_get_images_from_tarball(self):
         test_tarball = self.get_test_loc('repos/imagesv11.tar')
         extract_dir = self.get_temp_dir()
@@ -118,6 +143,22 @@ class TestImages(FileBasedTesting):
         test_dir = self.extract_test_tar(test_arch)
         Image.get_images_from_dir(test_dir, verify=True)
 
+    def test_Image_get_images_from_dir_with_verify_fails_if_config_is_modified(self):
+        test_arch = self.get_test_loc('repos/hello-world.tar')
+        test_dir = self.extract_test_tar(test_arch)
+        config_files = [
+            fn for fn in os.listdir(test_dir)
+            if fn.endswith('.json') and fn != 'manifest.json'
+        ]
+        for config_file in config_files:
+            with open(os.path.join(test_dir, config_file), 'a') as cf:
+                cf.write(' ')
+        try:
+            Image.get_images_from_dir(test_dir, verify=True)
+            self.fail('Exception not raised')
+        except Exception as e:
+            assert str(e).startswith('Image config ')
+
     def test_Image_get_images_from_dir_with_anotations(self):
         test_arch = self.get_test_loc('repos/images.tar.gz')
         test_dir = self.extract_test_tar(test_arch)
@@ -7,6 +7,7 @@
 #
 
 import os
+from unittest import mock
 
 from commoncode import fileutils
 from commoncode import testcase
@@ -29,6 +30,16 @@ class TestRootfs(testcase.FileBasedTesting):
         expected = ['/hello']
         assert expected == results
 
+    def test_rebuild_rootfs_fails_if_target_is_not_a_directory(self):
+        test_dir = self.extract_test_tar('rootfs/hello-world.tar')
+        img = image.Image.get_images_from_dir(test_dir)[0]
+        target_dir = os.path.join(self.get_temp_dir(), 'missing')
+        try:
+            rebuild_rootfs(img, target_dir)
+            self.fail('Exception not raised')
+        except Exception as e:
+            assert str(e).startswith('target_dir is not a directory:')
+
     def test_image_squash_simple(self):
         test_dir = self.extract_test_tar('rootfs/hello-world.tar')
         img = image.Image.get_images_from_dir(test_dir)[0]
@@ -58,6 +69,75 @@ class TestRootfs(testcase.FileBasedTesting):
         ]
         assert expected == results
 
+    def test_rebuild_rootfs_does_not_leave_temp_dirs_on_merge_errors(self):
+        test_dir = self.extract_test_tar(
+            'rootfs/she-image_from_scratch-1.0.tar')
+        img = image.Image.get_images_from_dir(test_dir)[0]
+        assert len(img.layers) > 2
+        parent_dir = self.get_temp_dir()
+        target_dir = os.path.join(parent_dir, 'rootfs')
+        os.mkdir(target_dir)
+
+        merged = []
+
+        def failing_merge_layer(extracted_loc, target_dir):
+            if merged:
+                raise Exception('merge failed')
+            merged.append(extracted_loc)
+            return merge_layer(extracted_loc, target_dir)
+
+        merge_layer = rootfs.merge_layer
+        with mock.patch.object(rootfs, 'merge_layer', failing_merge_layer):
+            try:
+                rebuild_rootfs(img, target_dir)
+                self.fail('Exception not raised')
+            except Exception as e:
+                assert str(e) == 'merge failed'
+
+        assert os.listdir(parent_dir) == ['rootfs']
+
+    def test_rebuild_rootfs_does_not_leave_temp_dirs_on_extract_errors(self):
+        test_dir = self.extract_test_tar(
+            'rootfs/she-image_from_scratch-1.0.tar')
+        img = image.Image.get_images_from_dir(test_dir)[0]
+        parent_dir = self.get_temp_dir()
+        target_dir = os.path.join(parent_dir, 'rootfs')
+        os.mkdir(target_dir)
+
+        extract = image.Layer.extract
+
+        def failing_extract(layer, extracted_location, skip_symlinks=True):
+            extract(layer, extracted_location=extracted_location,
+                    skip_symlinks=skip_symlinks)
+            if layer is img.layers[1]:
+                raise Exception('extract failed')
+
+        for max_workers in (1, 3):
+            with mock.patch.object(image.Layer, 'extract', failing_extract):
+                try:
+                    rebuild_rootfs(img, target_dir, max_workers=max_workers)
+                    self.fail('Exception not raised')
+                except Exception as e:
+                    assert str(e) == 'extract failed'
+
+            assert os.listdir(parent_dir) == ['rootfs']
+
+    def test_rebuild_rootfs_is_the_same_with_one_or_many_workers(self):
+        test_dir = self.extract_test_tar(
+            'rootfs/she-image_from_scratch-1.0.tar')
+        img = image.Image.get_images_from_dir(test_dir)[0]
+
+        results = []
+        for max_workers in (1, 3):
+            target_dir = self.get_temp_dir()
+            deletions = rebuild_rootfs(img, target_dir, max_workers=max_workers)
+            deletions = [d.replace(target_dir, '') for d in deletions]
+            paths = sorted([p.replace(target_dir, '')
+                            for p in fileutils.resource_iter(target_dir)])
+            results.append((deletions, paths))
+
+        assert results[0] == results[1]
+
     def test_rebuild_rootfs_multilayers(self):
         test_dir = self.extract_test_tar('rootfs/imagesv11.tar')
         target_dir = self.get_temp_dir()
@@ -171,6 +251,55 @@ class TestRootfs(testcase.FileBasedTesting):
         results = list(rootfs.find_whiteouts('baz', walker=mock_walker))
         assert results == []
 
+    def test_move_tree_overwrites_and_skips_symlinks(self):
+        src = self.get_temp_dir()
+        dst = self.get_temp_dir()
+
+        def write(loc, content):
+            os.makedirs(os.path.dirname(loc), exist_ok=True)
+            with open(loc, 'w') as f:
+                f.write(content)
+
+        write(os.path.join(dst, 'etc', 'foo'), 'old')
+        write(os.path.join(dst, 'bar', 'baz'), 'old')
+        write(os.path.join(dst, 'qux'), 'old')
+        write(os.path.join(dst, 'keep'), 'old')
+
+        write(os.path.join(src, 'etc', 'foo'), 'new')
+        # a file replacing a directory and a directory replacing a file
+        write(os.path.join(src, 'bar'), 'new')
+        write(os.path.join(src, 'qux', 'quux'), 'new')
+        os.symlink('etc/foo', os.path.join(src, 'link'))
+
+        rootfs.move_tree(src, dst)
+
+        results = sorted([p.replace(dst, '')
+                          for p in fileutils.resource_iter(dst, with_dirs=False)])
+        expected = ['/bar', '/etc/foo', '/keep', '/qux/quux']
+        assert expected == results
+        with open(os.path.join(dst, 'etc', 'foo')) as f:
+            assert f.read() == 'new'
+
+    def test_move_tree_renames_new_directories_and_keeps_timestamps(self):
+        src = self.get_temp_dir()
+        dst = self.get_temp_dir()
+        for loc in ('new/sub', 'merged/sub'):
+            os.makedirs(os.path.join(src, loc))
+            with open(os.path.join(src, loc, 'file'), 'w') as f:
+                f.write('new')
+        os.makedirs(os.path.join(dst, 'merged'))
+        for loc in ('new', 'merged'):
+            os.utime(os.path.join(src, loc), ns=(1000000000, 1000000000))
+        new_dir_ino = os.stat(os.path.join(src, 'new')).st_ino
+
+        rootfs.move_tree(src, dst)
+
+        # a new directory is renamed as a whole
+        assert os.stat(os.path.join(dst, 'new')).st_ino == new_dir_ino
+        for loc in ('new', 'merged'):
+            assert os.stat(os.path.join(dst, loc)).st_mtime_ns == 1000000000
+            assert os.path.exists(os.path.join(dst, loc, 'sub', 'file'))
+
     def test_rootfs_can_find_root(self):
 
         def mock_walker(root):
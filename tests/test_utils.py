@@ -7,10 +7,12 @@
 #
 
 import os
+from unittest import mock
 
 from commoncode import fileutils
 from commoncode import testcase
 
+from container_inspector import EMPTY_SHA256
 from container_inspector import utils
 
 from utilities import check_expected
@@ -252,3 +254,54 @@ class TestUtils(testcase.FileBasedTesting):
         expected_events = self.get_test_loc(
             'utils/layer_with_links_missing_targets.tar.expected-events-broken.json', must_exist=False)
         check_expected(events_results, expected_events, regen=False)
+
+    def test_load_json_with_and_without_orjson(self):
+        test_file = self.get_test_loc('utils/layer_with_links.tar.expected.json')
+        result = utils.load_json(test_file)
+        with mock.patch.object(utils, 'orjson', None):
+            assert utils.load_json(test_file) == result
+        assert result
+
+    def test_sha256_digests_returns_digests_in_order(self):
+        test_files = [
+            self.get_test_loc('utils/layer_with_links.tar'),
+            self.get_test_loc('utils/absolute_path.tar'),
+            self.get_test_loc('utils/tar_relative.tar'),
+        ]
+        expected = [utils.sha256_digest(f) for f in test_files]
+        assert utils.sha256_digests(test_files) == expected
+        assert utils.sha256_digests(test_files[:1]) == expected[:1]
+        assert utils.sha256_digests([]) == []
+
+    def test_sha256_digest_is_updated_when_file_changes(self):
+        test_file = os.path.join(self.get_temp_dir(), 'some.tar')
+        with open(test_file, 'w') as tf:
+            tf.write('')
+        assert utils.sha256_digest(test_file) == EMPTY_SHA256
+
+        with open(test_file, 'w') as tf:
+            tf.write('some content')
+        expected = '290f493c44f5d63d06b374d0a5abd292fae38b92cab2fae5efefe1b0e9347f56'
+        assert utils.sha256_digest(test_file) == expected
+
+    def test_sha256_digest_is_updated_when_file_is_replaced(self):
+        test_dir = self.get_temp_dir()
+        test_file = os.path.join(test_dir, 'some.tar')
+        with open(test_file, 'w') as tf:
+            tf.write('some content')
+        stat = os.stat(test_file)
+        expected = '290f493c44f5d63d06b374d0a5abd292fae38b92cab2fae5efefe1b0e9347f56'
+        assert utils.sha256_digest(test_file) == expected
+
+        # same path, size and mtime but a different file
+        other_file = os.path.join(test_dir, 'other.tar')
+        with open(other_file, 'w') as tf:
+            tf.write('other conten')
+        os.utime(other_file, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        os.replace(other_file, test_file)
+        assert utils.sha256_digest(test_file) != expected
+
+    def test_sha256_digest_returns_None_on_empty_or_missing_location(self):
+        assert utils.sha256_digest(None) is None
+        assert utils.sha256_digest('') is None
+        assert utils.sha256_digest('THIS/file/does/not/exists') is None